@@ -1,11 +1,11 @@
 import streamlit as st
-import io
-import nltk 
-from pypdf import PdfReader
-from sumy.parsers.plaintext import PlaintextParser
-from sumy.nlp.tokenizers import Tokenizer
-from sumy.summarizers.lsa import LsaSummarizer
-from sumy.nlp.stemmers import Stemmer
+import heapq
+import html
+import re
+
+# Les dépendances lourdes (PyMuPDF, spaCy, Sumy, scikit-learn, NumPy) sont importées
+# dans les fonctions qui les utilisent : Streamlit ré-exécute ce script à chaque
+# interaction, et le téléversement doit s'afficher sans attendre leur chargement.
 
 # --- Configuration de la page Streamlit ---
 st.set_page_config(
@@ -13,58 +13,156 @@ st.set_page_config(
     layout="wide"
 )
 
-# --- Initialisation des Dépendances NLTK ---
+# --- Initialisation du Découpeur de Phrases (spaCy) ---
 @st.cache_resource
-def download_nltk_resources():
-    """Télécharge les ressources NLTK 'punkt' nécessaires à Sumy pour le français."""
+def load_sentence_splitter():
+    """Charge un pipeline spaCy français réduit au 'sentencizer' (remplace Punkt de NLTK)."""
     try:
-        # st.toast("Vérification et téléchargement des dépendances linguistiques NLTK...", icon="🛠️")
-        nltk.download('punkt', quiet=True)
-        nltk.download('punkt_tab', quiet=True) 
-        return True
+        import spacy
+        nlp = spacy.blank("fr")
+        nlp.add_pipe("sentencizer")
+        return nlp
     except Exception as e:
-        st.error(f"Erreur lors du téléchargement des ressources NLTK. Détails : {e}")
-        return False
-
-if not download_nltk_resources():
-    st.stop()
-else:
-    st.sidebar.success("✅ Dépendances linguistiques NLTK chargées.")
+        st.error(f"Erreur lors du chargement du découpeur de phrases spaCy. Détails : {e}")
+        return None
 
 # --- Constantes et Configuration ---
 LANGUAGE = "french"
 SENTENCES_COUNT = 10 
-STEMMER = Stemmer(LANGUAGE)
+TFIDF_MAX_SENTENCES = 50
+SPARSE_LSA_MIN_COMPONENTS = 3
+SPARSE_LSA_MAX_COMPONENTS = 100
+SPARSE_LSA_REDUCTION_RATIO = 0.05
+SCANNED_PDF_MESSAGE = "Le PDF semble être basé sur des images (scanné) et ne contient pas de texte lisible. Veuillez utiliser un PDF avec du texte sélectionnable."
+
+# --- Tokenizer compatible Sumy ---
+class SpacyTokenizer:
+    """Découpe en phrases avec spaCy et en mots avec une regex, à la place du Tokenizer NLTK de Sumy."""
+
+    WORD_PATTERN = re.compile(r"\w*[^\W\d_]\w*")
+
+    def __init__(self, nlp, language=LANGUAGE):
+        self._nlp = nlp
+        self.language = language
+
+    def to_sentences(self, paragraph):
+        return tuple(sentence.text.strip() for sentence in self._nlp(paragraph).sents)
+
+    def to_words(self, sentence):
+        return tuple(self.WORD_PATTERN.findall(sentence))
+
+# --- Objets NLP partagés (créés une seule fois par processus) ---
+@st.cache_resource
+def get_tokenizer():
+    """Tokenizer Sumy (spaCy) partagé entre toutes les exécutions du script."""
+    return SpacyTokenizer(load_sentence_splitter())
 
 # --- Fonction d'Extraction de Texte ---
 @st.cache_data
-def extract_text_from_pdf(uploaded_file):
-    """Extrait tout le texte d'un fichier PDF."""
+def extract_text_from_pdf(pdf_bytes):
+    """Extrait tout le texte d'un fichier PDF (contenu brut en octets)."""
     st.info("Extraction du texte à partir du PDF...")
     try:
-        reader = PdfReader(io.BytesIO(uploaded_file.read()))
-        text = ""
-        for page_num, page in enumerate(reader.pages):
-            text += page.extract_text() or f" [PAGE {page_num + 1} SANS TEXTE] "
+        import pymupdf
+
+        # Extraction séquentielle volontaire : PyMuPDF n'est pas thread-safe et ne
+        # relâche pas le GIL, un ThreadPoolExecutor par page n'accélérerait rien.
+        with pymupdf.open(stream=pdf_bytes, filetype="pdf") as doc:
+            parts = [page.get_text("text") for page in doc]
         
-        if len(text.strip()) < 100:
-             st.error("Le PDF semble être basé sur des images (scanné) et ne contient pas de texte lisible. Veuillez utiliser un PDF avec du texte sélectionnable.")
+        # Seul le texte réellement extrait compte (pas les marqueurs de pages vides).
+        # Vérification sur tout le document : une couverture ou des premières pages
+        # scannées ne suffisent pas à rejeter un PDF dont le corps contient du texte
+        if sum(len(part.strip()) for part in parts) < 100:
+             st.error(SCANNED_PDF_MESSAGE)
              return None
         
-        return text
+        return "".join(
+            part or f" [PAGE {page_num + 1} SANS TEXTE] "
+            for page_num, part in enumerate(parts)
+        )
     except Exception as e:
         st.error(f"Erreur fatale lors de l'extraction du texte : {e}")
         return None
 
 # --- Fonction de Résumé (Sumy) ---
+@st.cache_data(show_spinner=False)
+def compute_sentence_scores(text):
+    """Calcule une seule fois par texte le score de chaque phrase (TF-IDF ou LSA).
+
+    Le score d'une phrase ne dépend pas du nombre de phrases demandé : changer le
+    slider ne fait donc que re-sélectionner parmi des scores déjà calculés.
+    """
+    from sumy.parsers.plaintext import PlaintextParser
+
+    parser = PlaintextParser.from_string(text, get_tokenizer())
+    sentences = [str(sentence) for sentence in parser.document.sentences]
+
+    # Courts documents : une SVD est superflue, le poids TF-IDF des phrases suffit
+    if len(sentences) < TFIDF_MAX_SENTENCES:
+        return sentences, compute_tfidf_scores(sentences)
+
+    # Autres documents : LSA sur la matrice TF-IDF creuse (scikit-learn, API publique) ;
+    # le classement diffère de celui du LsaSummarizer de Sumy (pondération et nombre de sujets)
+    return sentences, compute_sparse_lsa_scores(sentences)
+
+def build_tfidf_matrix(sentences, norm="l2", sublinear_tf=False):
+    """Matrice TF-IDF creuse (phrases × termes, format CSR) sans les mots vides français."""
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sumy.utils import get_stop_words
+
+    vectorizer = TfidfVectorizer(
+        stop_words=list(get_stop_words(LANGUAGE)),
+        token_pattern=r"(?u)\b\w+\b",
+        norm=norm,
+        sublinear_tf=sublinear_tf,
+    )
+    return vectorizer.fit_transform(sentences)
+
+def compute_tfidf_scores(sentences):
+    """Score de chaque phrase = somme des poids TF-IDF de ses mots (sans SVD)."""
+    import numpy as np
+
+    try:
+        matrix = build_tfidf_matrix(sentences)
+    except ValueError:  # aucun mot hors mots vides
+        return [0.0] * len(sentences)
+    return np.asarray(matrix.sum(axis=1)).ravel().tolist()
+
+def compute_sparse_lsa_scores(sentences):
+    """Score LSA (Steinberger-Ježek) sur une matrice TF-IDF creuse via TruncatedSVD."""
+    import numpy as np
+    from sklearn.decomposition import TruncatedSVD
+
+    # Lignes non normalisées : chaque phrase garde son poids (avec norm='l2', toutes les
+    # lignes sont unitaires et les scores valent ~1 dès que la SVD est presque complète)
+    try:
+        matrix = build_tfidf_matrix(sentences, norm=None, sublinear_tf=True)
+    except ValueError:  # aucun mot hors mots vides
+        return [0.0] * len(sentences)
+    
+    # Peu de sujets (5 % du nombre de phrases, comme la réduction de Steinberger-Ježek) :
+    # seuls les thèmes récurrents du document contribuent au score
+    n_components = min(
+        SPARSE_LSA_MAX_COMPONENTS,
+        max(SPARSE_LSA_MIN_COMPONENTS, int(matrix.shape[0] * SPARSE_LSA_REDUCTION_RATIO)),
+        matrix.shape[0] - 1,
+        matrix.shape[1] - 1,
+    )
+    if n_components < 1:
+        return [0.0] * len(sentences)
+    
+    # Lignes de U·Σ : la norme de chaque ligne est le score de la phrase correspondante
+    weighted_topics = TruncatedSVD(n_components=n_components, random_state=0).fit_transform(matrix)
+    return np.linalg.norm(weighted_topics, axis=1).tolist()
+
 def summarize_text_with_sumy(text, sentences_count=SENTENCES_COUNT):
-    """Utilise l'algorithme LSA de Sumy pour générer un résumé extractif."""
-    parser = PlaintextParser.from_string(text, Tokenizer(LANGUAGE))
-    summarizer = LsaSummarizer(STEMMER)
-    summary_sentences = summarizer(parser.document, sentences_count)
+    """Génère un résumé extractif à partir des scores de phrases (TF-IDF ou LSA)."""
+    sentences, scores = compute_sentence_scores(text)
+    best = heapq.nlargest(sentences_count, range(len(sentences)), key=scores.__getitem__)
     
-    # Retourne une liste Python des phrases. Streamlit les affichera mieux ainsi.
-    summary_list = [str(sentence) for sentence in summary_sentences]
+    # Retourne une liste Python des phrases, dans l'ordre du document.
+    summary_list = [sentences[i] for i in sorted(best)]
     return summary_list # ON RETOURNE UNE LISTE, PAS UNE CHAÎNE
 
 # --- Interface Utilisateur (UX) Streamlit (Mobile Friendly) ---
@@ -96,13 +194,17 @@ def main():
             if st.button("🚀 Générer le Résumé du Cours", use_container_width=True):
                 
                 # --- Étape 1 : Extraction ---
-                text_content = extract_text_from_pdf(uploaded_file)
+                text_content = extract_text_from_pdf(uploaded_file.getvalue())
                 
                 if not text_content:
                     return
                 
                 # --- Étape 2 : Résumé ---
-                with st.spinner(f"⏳ L'algorithme LSA sélectionne les {sentences_count_slider} phrases les plus importantes..."):
+                # Le découpeur de phrases n'est chargé qu'à la première demande de résumé
+                if load_sentence_splitter() is None:
+                    return
+                
+                with st.spinner(f"⏳ Sélection des {sentences_count_slider} phrases les plus importantes (TF-IDF ou LSA selon la longueur)..."):
                     # summary_result est désormais une LISTE de phrases
                     summary_list = summarize_text_with_sumy(text_content, sentences_count_slider)
                 
@@ -119,9 +221,11 @@ def main():
                 )
                 
                 # NOUVEL AFFICHAGE : Utilisation de st.markdown avec une liste non ordonnée
+                # (phrases échappées : un '<' dans le PDF ne doit pas casser le HTML)
+                items = "".join(map("<li>{}</li>".format, map(html.escape, summary_list)))
                 st.markdown(
-                    f'<div style="border: 1px solid #ddd; padding: 15px; border-radius: 5px; background-color: #f9f9f9; color: #333;"><ul>' 
-                    + "".join([f'<li>{phrase}</li>' for phrase in summary_list]) 
+                    '<div style="border: 1px solid #ddd; padding: 15px; border-radius: 5px; background-color: #f9f9f9; color: #333;"><ul>' 
+                    + items
                     + '</ul></div>',
                     unsafe_allow_html=True
                 )
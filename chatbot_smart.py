@@ -1,10 +1,39 @@
-from flask import Flask, request, render_template_string
+from flask import Flask, request, session
+from flask_caching import Cache
+from markupsafe import Markup, escape
 import os
+import secrets
+import contextlib
+import functools
+import hashlib
+import time
 import json
 import re
-from difflib import SequenceMatcher
+import ahocorasick
+import numpy as np
+from rapidfuzz import fuzz, process
+from scipy.sparse import csr_matrix
+
+try:
+    import orjson  # parseur JSON en Rust, plus rapide au démarrage
+except ImportError:
+    orjson = None
 
 app = Flask(__name__)
+# Clé de signature du cookie de session : à fixer dans l'environnement en production
+# (une clé aléatoire invalide les sessions à chaque redémarrage et diffère entre workers)
+app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY') or secrets.token_hex(32)
+# Cache des pages rendues, des réponses et stockage des conversations : en mémoire du processus
+# par défaut, CACHE_TYPE=RedisCache (+ CACHE_REDIS_URL) pour le partager entre plusieurs workers
+CACHE_TYPE = os.environ.get('CACHE_TYPE', 'SimpleCache')
+# Un backend externe (Redis, Memcached...) survit au processus : il sert de second cache des réponses
+SHARED_CACHE = CACHE_TYPE not in ('SimpleCache', 'NullCache')
+cache = Cache(app, config={
+    'CACHE_TYPE': CACHE_TYPE,
+    'CACHE_REDIS_URL': os.environ.get('CACHE_REDIS_URL'),
+    # SimpleCache élague au-delà de 500 entrées par défaut : les historiques n'en feraient pas partie
+    'CACHE_THRESHOLD': 10000,
+})
 
 DATA_DIR = "data"
 
@@ -12,191 +41,396 @@ def load_json(filename):
     """Load a JSON file"""
     path = os.path.join(DATA_DIR, filename) if not filename.startswith(DATA_DIR) else filename
     if os.path.exists(path):
-        with open(path, "r", encoding="utf-8") as f:
-            return json.load(f)
+        with open(path, "rb") as f:
+            content = f.read()
+        return orjson.loads(content) if orjson else json.loads(content)
     return None
 
-def similarity(a, b):
-    """Calculate similarity between two strings"""
-    return SequenceMatcher(None, a.lower(), b.lower()).ratio()
+TUNISIAN_DIGITS = str.maketrans({'3': 'a'})  # Tunisian: 3 -> a
+NON_ALNUM_RE = re.compile(r'[^a-z0-9\s]')
+# Table fixe pour les 128 caractères ASCII : 3 -> a, [a-z0-9] et espaces conservés, le reste supprimé
+ASCII_NORMALIZE_TABLE = str.maketrans({
+    chr(code): 'a' if chr(code) == '3' else chr(code) if NON_ALNUM_RE.match(chr(code)) is None else None
+    for code in range(128)
+})
 
 def normalize_text(text):
-    """Normalize text for matching"""
+    """Normalize text for matching (idempotent: normalizing twice changes nothing)"""
     text = text.lower()
-    text = re.sub(r'3', 'a', text)  # Tunisian: 3 -> a
-    text = re.sub(r'[^a-z0-9\s]', '', text)
-    return text
+    # Cas courant (questions en français/tunisien latin) : une seule passe str.translate
+    if text.isascii():
+        return text.translate(ASCII_NORMALIZE_TABLE)
+    return NON_ALNUM_RE.sub('', text.translate(TUNISIAN_DIGITS))
 
 # --- NOUVELLE FONCTION 1 : EXTRAIRE LE NOM DU PROGRAMME ---
+# Liste des mots-clés de programmes courants (à compléter avec les données réelles de l'ISSAT)
+PROGRAM_KEYWORDS = [
+    'automatique', 'informatique industrielle', 'reseaux', 'genie civil', 
+    'genie electrique', 'telecom', 'mecanique', 'industrie', 'génie',
+    'electronique', 'informatique'
+]
+
+# Automate Aho-Corasick : tous les mots-clés trouvés en un seul passage sur la question,
+# quel que soit le nombre de mots-clés (valeur : rang dans PROGRAM_KEYWORDS, mot-clé)
+PROGRAM_AUTOMATON = ahocorasick.Automaton()
+for rank, keyword in enumerate(PROGRAM_KEYWORDS):
+    PROGRAM_AUTOMATON.add_word(keyword, (rank, keyword))
+PROGRAM_AUTOMATON.make_automaton()
+
+# Regex compilées une seule fois
+MASTER_LICENCE_RE = re.compile(r'\b(master|licence)\s+(.+)')
+DE_RE = re.compile(r"\b(?:de|du|d'un)\s+(\S+)")
+
 def extract_program_name(question_lower):
     """Tente d'extraire le nom du programme (Mention ou Parcours) de la question."""
     
-    # Liste des mots-clés de programmes courants (à compléter avec les données réelles de l'ISSAT)
-    program_keywords = [
-        'automatique', 'informatique industrielle', 'reseaux', 'genie civil', 
-        'genie electrique', 'telecom', 'mecanique', 'industrie', 'génie',
-        'electronique', 'informatique'
-    ]
-    
     best_match = None
     best_score = 0.5 # Seuil minimum de confiance
     
-    # 1. Extraction simple de mots-clés
-    for keyword in program_keywords:
-        if keyword in question_lower:
-            return keyword
+    # 1. Extraction des mots-clés (en début de mot). Comme la liste est parcourue dans
+    # l'ordre, le mot-clé de plus petit rang l'emporte, quelle que soit sa position dans
+    # la question ('informatique industrielle' passe donc avant 'informatique')
+    found = min(
+        (
+            (rank, keyword)
+            for end, (rank, keyword) in PROGRAM_AUTOMATON.iter(question_lower)
+            if end + 1 == len(keyword)
+            or not (question_lower[end - len(keyword)].isalnum() or question_lower[end - len(keyword)] == '_')
+        ),
+        default=None,
+    )
+    if found:
+        return found[1]
             
     # 2. Tentative d'extraction par regex (pour les expressions comme "master xxx")
-    match = re.search(r'(master|licence)\s+(.+)', question_lower)
+    match = MASTER_LICENCE_RE.search(question_lower)
     if match:
         potential_name = match.group(2).strip()
         # On ne prend que les premiers mots si la phrase est longue
         potential_name = ' '.join(potential_name.split()[:3]) 
 
         # On vérifie si ce nom potentiel matche un des mots-clés connus
-        for keyword in program_keywords:
-            score = similarity(potential_name, keyword)
-            if score > best_score:
-                best_score = score
-                best_match = keyword
+        # (tous les mots-clés scorés en un appel RapidFuzz ; le premier meilleur l'emporte)
+        best = process.extractOne(potential_name, PROGRAM_KEYWORDS, scorer=fuzz.ratio, processor=None)
+        if best and best[1] / 100.0 > best_score:
+            best_match = best[0]
                 
         if best_match:
             return best_match
 
     # 3. Extraction de termes après des prépositions spécifiques (ex: de l')
-    match_de = re.search(r'(de|du|d\'un)\s+(.+)', question_lower)
+    match_de = DE_RE.search(question_lower)
     if match_de:
-        potential_name = match_de.group(2).strip().split()[0] # Ne prendre que le premier mot
-        for keyword in program_keywords:
-            if similarity(potential_name, keyword) > 0.7: # Seuil plus strict
+        potential_name = match_de.group(1) # Ne prendre que le premier mot
+        # Premier mot-clé (dans l'ordre de la liste) au-dessus du seuil plus strict
+        for keyword, score, _ in process.extract_iter(potential_name, PROGRAM_KEYWORDS, scorer=fuzz.ratio, processor=None, score_cutoff=70):
+            if score / 100.0 > 0.7:
                 return keyword
                 
     return None
 
 # --- NOUVELLE FONCTION 2 : EXTRAIRE LE SEMESTRE ET LE TYPE D'HEURE ---
+# Question découpée en mots une seule fois ; les expressions de plusieurs mots par regex
+WORD_RE = re.compile(r'\w+')
+SEMESTER_TOKENS = {'s1': 1, 's2': 2, 's3': 3, 's4': 4}
+SEMESTER_ORDINALS = {'premier': 1, 'deuxième': 2, 'troisième': 3, 'quatrième': 4}
+# Deux regex distinctes : 'troisième semestre 1' contient les deux formes, qui se chevauchent
+SEMESTER_NUMBER_RE = re.compile(r'\bsemestre\s+([1-4])\b')
+SEMESTER_ORDINAL_RE = re.compile(r'\b(premier|deuxième|troisième|quatrième)\s+semestre')
+# Types d'heure reconnus en début de mot ('tps', 'tp1', 'pratiques'), jamais au milieu ('stp', 'parcours')
+TP_PREFIXES = ('tp', 'pratique')
+TD_PREFIXES = ('td', 'dirigés')
+COURS_PREFIXES = ('cours',)
+TOTAL_HOURS_RE = re.compile(r'\b(?:volume horaire|total heures|heures total)')
+
 def extract_details(question_lower):
     """Extrait le semestre et le type d'heure (TP/TD/Cours) de la question."""
     
-    semestre = None
-    if 'semestre 1' in question_lower or 's1' in question_lower or 'premier semestre' in question_lower:
-        semestre = 1
-    elif 'semestre 2' in question_lower or 's2' in question_lower or 'deuxième semestre' in question_lower:
-        semestre = 2
-    elif 'semestre 3' in question_lower or 's3' in question_lower or 'troisième semestre' in question_lower:
-        semestre = 3
-    elif 'semestre 4' in question_lower or 's4' in question_lower or 'quatrième semestre' in question_lower:
-        semestre = 4
+    tokens = set(WORD_RE.findall(question_lower))
+    
+    semestres = {SEMESTER_TOKENS[token] for token in tokens & SEMESTER_TOKENS.keys()}
+    semestres.update(int(number) for number in SEMESTER_NUMBER_RE.findall(question_lower))
+    semestres.update(SEMESTER_ORDINALS[ordinal] for ordinal in SEMESTER_ORDINAL_RE.findall(question_lower))
+    # Comme auparavant, le plus petit numéro de semestre cité l'emporte
+    semestre = min(semestres) if semestres else None
         
     type_heure = None
-    if any(word in question_lower for word in ['tp', 'travaux pratiques', 'pratique']):
+    if any(token.startswith(TP_PREFIXES) for token in tokens):
         type_heure = 'tp'
-    elif any(word in question_lower for word in ['td', 'travaux dirigés', 'dirigés']):
+    elif any(token.startswith(TD_PREFIXES) for token in tokens):
         type_heure = 'td'
-    elif any(word in question_lower for word in ['cours', 'cours magistral', 'heures cours']):
+    elif any(token.startswith(COURS_PREFIXES) for token in tokens):
         type_heure = 'cours'
-    elif any(word in question_lower for word in ['volume horaire', 'total heures', 'heures total']):
+    elif TOTAL_HOURS_RE.search(question_lower):
         type_heure = 'total'
         
     return semestre, type_heure
 # ----------------------------------------------------------------------
 
 
-def find_best_qa_match(user_question, qa_data):
-    # (Pas de changement dans cette fonction)
-    """Find the best matching Q&A from training data"""
-    user_norm = normalize_text(user_question)
-    best_match = None
-    best_score = 0
-    
+KEYWORD_BONUS = 0.3
+
+def build_qa_index(qa_data):
+    """Flatten the Q&A categories into parallel lists, normalize them and build the keyword matrix once, at startup"""
+    # Colonnes parallèles (une entrée par Q&A, dans l'ordre du fichier)
+    questions, answers, qa_keywords = [], [], []
     for category in qa_data.values():
         for qa in category:
-            # Check similarity with question
-            q_score = similarity(user_norm, normalize_text(qa['question']))
-            
-            # Check keyword matches
-            keyword_score = 0
-            for keyword in qa.get('keywords', []):
-                if normalize_text(keyword) in user_norm:
-                    keyword_score += 0.3
-            
-            total_score = q_score + keyword_score
-            
-            if total_score > best_score:
-                best_score = total_score
-                best_match = qa
+            questions.append(normalize_text(qa['question']))
+            answers.append(qa['answer'])
+            qa_keywords.append([normalize_text(keyword) for keyword in qa.get('keywords', [])])
+    if not questions:
+        return questions, answers, {}, None, None
+    
+    # Question normalisée -> première entrée correspondante (accès direct aux questions identiques)
+    question_ids = {}
+    for i, question_norm in enumerate(questions):
+        question_ids.setdefault(question_norm, i)
+    
+    # Matrice creuse (Q&A x mot-clé) : le bonus de mots-clés devient un produit matrice-vecteur
+    # (un mot-clé vide après normalisation ne désigne rien : il est ignoré)
+    keywords = sorted({keyword for keywords_norm in qa_keywords for keyword in keywords_norm if keyword})
+    keyword_ids = {keyword: j for j, keyword in enumerate(keywords)}
+    rows, cols = [], []
+    for i, keywords_norm in enumerate(qa_keywords):
+        for keyword in keywords_norm:
+            if not keyword:
+                continue
+            rows.append(i)
+            cols.append(keyword_ids[keyword])
+    keyword_matrix = csr_matrix(
+        (np.ones(len(rows)), (rows, cols)), shape=(len(questions), len(keywords))
+    )
+    
+    # Automate Aho-Corasick sur tous les mots-clés : un seul passage sur la question
+    # donne toutes les colonnes présentes (None s'il n'y a aucun mot-clé)
+    keyword_automaton = None
+    if keywords:
+        keyword_automaton = ahocorasick.Automaton()
+        for j, keyword in enumerate(keywords):
+            keyword_automaton.add_word(keyword, j)
+        keyword_automaton.make_automaton()
+    return questions, answers, question_ids, keyword_automaton, keyword_matrix
+
+# --- DÉTECTION DES INTENTIONS : UNE SEULE REGEX À GROUPES NOMMÉS ---
+INTENT_KEYWORDS = {
+    'greeting': ['ahla', 'salam', 'aslema', 'labes', 'chnahwelek', 'aychek', 'bonjour', 'salut'],
+    'credit': ['crédit', 'credit', 'ects'],
+    'semester': ['semestre', 'cours du', 'matières', 'ues'],
+    'director': ['directeur', 'director'],
+    'licence': ['licence', 'bachelor'],
+    'master': ['master'],
+    'absence': ['absence', 'absent', 'justif'],
+    'issat': ['issat', 'institut', 'kairouan', 'creation', 'créé'],
+}
+
+# Intentions reconnues n'importe où dans un mot (les salutations s'écrivent souvent
+# accolées : 'assalam', 'ahlaaa') ; les autres en début de mot
+SUBSTRING_INTENTS = {'greeting'}
+
+def intent_pattern(intent, words):
+    """Groupe nommé de l'intention : une alternative par mot-clé."""
+    anchor = '' if intent in SUBSTRING_INTENTS else r'\b'
+    return rf"(?P<{intent}>{anchor}(?:{'|'.join(re.escape(word) for word in words)}))"
+
+INTENT_RE = re.compile('|'.join(
+    intent_pattern(intent, words) for intent, words in INTENT_KEYWORDS.items()
+))
+
+def detect_intents(question_lower):
+    """Retourne l'ensemble des intentions présentes dans la question, en un seul passage."""
+    return {match.lastgroup for match in INTENT_RE.finditer(question_lower)}
+
+def find_best_qa_match(user_norm, qa_index):
+    """Find the best matching Q&A from training data (user_norm is already normalized)"""
+    questions, answers, question_ids, keyword_automaton, keyword_matrix = qa_index
+    if not question_ids:
+        return None, 0
+    
+    # Check keyword matches (keywords are already normalized), for all questions at once
+    keyword_hits = np.zeros(keyword_matrix.shape[1])
+    if keyword_automaton is not None:
+        for _, j in keyword_automaton.iter(user_norm):
+            keyword_hits[j] = 1.0
+    keyword_scores = KEYWORD_BONUS * (keyword_matrix @ keyword_hits)
+    
+    # Question identique à une question connue : ratio de 100, imbattable si aucune
+    # autre entrée n'a un meilleur bonus de mots-clés (pas d'appel à RapidFuzz)
+    exact = question_ids.get(user_norm)
+    if exact is not None and keyword_scores[exact] == keyword_scores.max():
+        return answers[exact], float(1.0 + keyword_scores[exact])
+    
+    best_answer = None
+    best_score = 0
+    best_index = len(questions)
+    
+    # Score final inchangé (RapidFuzz + bonus). Les questions sont parcourues par bonus
+    # décroissant : un score ne dépasse jamais 1 + bonus, on s'arrête dès que le meilleur
+    # score trouvé est hors d'atteinte pour toutes les questions restantes
+    user_len = len(user_norm)
+    for i in np.argsort(-keyword_scores, kind='stable'):
+        if 1.0 + keyword_scores[i] < best_score:
+            break
+        # Le ratio ne dépasse jamais 2·min(la, lb) / (la + lb) : les longueurs trop
+        # différentes sont écartées sans appeler RapidFuzz (marge pour les arrondis)
+        question_len = len(questions[i])
+        if user_len + question_len:
+            ratio_bound = 2 * min(user_len, question_len) / (user_len + question_len)
+            if ratio_bound + keyword_scores[i] < best_score - 1e-9:
+                continue
+        total_score = fuzz.ratio(user_norm, questions[i]) / 100.0 + keyword_scores[i]
+        
+        # À score égal, la première question du fichier l'emporte (comme avant)
+        if total_score > best_score or (total_score == best_score and i < best_index):
+            best_score = total_score
+            best_answer = answers[i]
+            best_index = i
     
     # Return match if score is good enough
     if best_score > 0.4:
-        return best_match['answer'], best_score
+        return best_answer, float(best_score)
     
     return None, 0
 
-def calculate_master_stats(master_data, parcours_name):
+def calculate_master_stats(master):
     """Calculate statistics for a master program"""
-    # La logique de recherche utilise maintenant le parcours_name générique
-    # La recherche est insensible à la casse et vérifie Mention ou Parcours
-    for master in master_data:
-        if parcours_name.lower() in master.get('Parcours', '').lower() or \
-           parcours_name.lower() in master.get('Mention', '').lower():
-            
-            stats = {
-                'title': f"Master {master.get('Parcours') or master.get('Mention')}", # Nouveau: titre pour l'affichage
-                'total_credits': 0,
-                'total_tp_hours': 0,
-                'total_cours_hours': 0,
-                'total_td_hours': 0,
-                'semesters': []
+    # Heures stockées en colonnes (une entrée par ECUE, dans l'ordre du JSON) :
+    # chaque total devient un sum() sur une tranche contiguë
+    tp_hours, cours_hours, td_hours = [], [], []
+    
+    stats = {
+        'title': f"Master {master.get('Parcours') or master.get('Mention')}", # Nouveau: titre pour l'affichage
+        'total_credits': 0,
+        'total_tp_hours': 0,
+        'total_cours_hours': 0,
+        'total_td_hours': 0,
+        'semesters': []
+    }
+
+    for sem in master.get('Semestres', []):
+        sem_start = len(tp_hours)
+        sem_stats = {
+            'numero': sem.get('Semestre'),
+            'credits': sem.get('Total_Credits', 0),
+            'volume_horaire': sem.get('Total_Volume_Horaire_Presentiel', 0),
+            'tp_hours': 0,
+            'cours_hours': 0,
+            'td_hours': 0,
+            'ues': []
+        }
+
+        for ue in sem.get('Unites_Enseignement', []):
+            ue_start = len(tp_hours)
+            ue_info = {
+                'nom': ue.get('Libelle_UE'),
+                'credits': ue.get('Cr_UE'),
+                'ecues': []
             }
-            
-            for sem in master.get('Semestres', []):
-                sem_stats = {
-                    'numero': sem.get('Semestre'),
-                    'credits': sem.get('Total_Credits', 0),
-                    'volume_horaire': sem.get('Total_Volume_Horaire_Presentiel', 0),
-                    'tp_hours': 0,
-                    'cours_hours': 0,
-                    'td_hours': 0,
-                    'ues': []
-                }
-                
-                for ue in sem.get('Unites_Enseignement', []):
-                    ue_info = {
-                        'nom': ue.get('Libelle_UE'),
-                        'credits': ue.get('Cr_UE'),
-                        'ecues': []
-                    }
-                    
-                    for ecue in ue.get('ECUEs', []):
-                        tp = ecue.get('TP', 0)
-                        cours = ecue.get('Cours', 0)
-                        td = ecue.get('TD', 0)
-                        
-                        sem_stats['tp_hours'] += tp
-                        sem_stats['cours_hours'] += cours
-                        sem_stats['td_hours'] += td
-                        
-                        ue_info['ecues'].append({
-                            'nom': ecue.get('Libelle_ECUE'),
-                            'credits': ecue.get('Cr_ECUE'),
-                            'cours': cours,
-                            'td': td,
-                            'tp': tp
-                        })
-                    
-                    sem_stats['ues'].append(ue_info)
-                
-                stats['total_credits'] += sem_stats['credits']
-                stats['total_tp_hours'] += sem_stats['tp_hours']
-                stats['total_cours_hours'] += sem_stats['cours_hours']
-                stats['total_td_hours'] += sem_stats['td_hours']
-                stats['semesters'].append(sem_stats)
-            
-            return stats
+
+            for ecue in ue.get('ECUEs', []):
+                tp_hours.append(ecue.get('TP', 0))
+                cours_hours.append(ecue.get('Cours', 0))
+                td_hours.append(ecue.get('TD', 0))
+
+                ue_info['ecues'].append({
+                    'nom': ecue.get('Libelle_ECUE'),
+                    'credits': ecue.get('Cr_ECUE'),
+                    'cours': cours_hours[-1],
+                    'td': td_hours[-1],
+                    'tp': tp_hours[-1]
+                })
+
+            ue_slice = slice(ue_start, len(tp_hours))
+            ue_info['tp_total'] = sum(tp_hours[ue_slice])
+            ue_info['cours_total'] = sum(cours_hours[ue_slice])
+            ue_info['td_total'] = sum(td_hours[ue_slice])
+
+            sem_stats['ues'].append(ue_info)
+
+        sem_slice = slice(sem_start, len(tp_hours))
+        sem_stats['tp_hours'] = sum(tp_hours[sem_slice])
+        sem_stats['cours_hours'] = sum(cours_hours[sem_slice])
+        sem_stats['td_hours'] = sum(td_hours[sem_slice])
+
+        stats['total_credits'] += sem_stats['credits']
+        stats['semesters'].append(sem_stats)
+
+    stats['total_tp_hours'] = sum(tp_hours)
+    stats['total_cours_hours'] = sum(cours_hours)
+    stats['total_td_hours'] = sum(td_hours)
+
+    return stats
+
+def build_master_index(master_data):
+    """Precompute the statistics of every master once, at startup, indexed by program keyword"""
+    # Index par Parcours / Mention en minuscules (le premier master rencontré l'emporte)
+    stats_by_key = {}
+    for master in master_data:
+        stats = calculate_master_stats(master)
+        for field in ('Parcours', 'Mention'):
+            key = master.get(field, '').lower()
+            if key:
+                stats_by_key.setdefault(key, stats)
     
-    return None
+    # Chaque mot-clé de programme pointe vers le premier master dont le Parcours ou la Mention le contient
+    program_to_stats = {}
+    for keyword in PROGRAM_KEYWORDS:
+        for key, stats in stats_by_key.items():
+            if keyword in key:
+                program_to_stats[keyword] = stats
+                break
+    
+    return program_to_stats
 
-def get_smart_response(user_question, all_data, qa_data):
+# Réponses sans partie variable : chaînes construites une seule fois, au chargement
+GREETING_RESPONSE = """
+<strong>Ahla w sahla bik! 👋</strong><br>
+<strong>Labes elhamdulillah! 💙</strong><br><br>
+Ena assistant mta3 l'ISSAT Kairouan, m3allem 3la kol les données! 😊<br><br>
+<strong>💡 Njem nsa3dek fi:</strong><br>
+• Détails des programmes (Licences, Masters)<br>
+• Heures de cours, TP, TD, crédits<br>
+• Procédures administratives<br>
+• Règles d'absence<br>
+• Informations sur l'institut<br><br>
+<strong>Exemples de questions:</strong><br>
+• "Combien d'heures de TP dans le master automatique?"<br>
+• "Quels sont les cours du semestre 1?"<br>
+• "Comment justifier une absence?"<br><br>
+Qolli chnowa t7eb ta3ref! 🎓
+"""
+
+FALLBACK_RESPONSE = """
+<strong>🤔 Je n'ai pas bien compris ta question...</strong><br><br>
+💡 <strong>Exemples de questions:</strong><br>
+• "Combien d'heures de TP dans le master automatique?"<br>
+• "Quels sont les masters disponibles?"<br>
+• "Quelles licences sont disponibles?"<br>
+• "Comment justifier une absence?"<br>
+• "Qui est le directeur?"<br><br>
+Essaie de reformuler! 😊
+"""
+
+def get_smart_response(user_question):
     """Generate intelligent response"""
+    # La réponse ne dépend que de la question en minuscules : clé du cache
+    return route_question(user_question.lower())
+
+def memoize_if_shared(timeout):
+    """Memoize in the Flask-Caching backend only when it outlives the process (keyed on the data)"""
+    if not SHARED_CACHE:
+        # SimpleCache ferait double emploi avec lru_cache
+        return lambda function: function
+    # L'empreinte des fichiers chargés fait partie de la clé : une mise à jour des données
+    # n'est jamais servie avec les réponses mémorisées avant le redémarrage
+    return cache.memoize(timeout=timeout, make_name=lambda name: f"{name}/{data_fingerprint}")
+
+# Deux niveaux de cache : lru_cache dans le processus, puis le backend Flask-Caching
+# s'il est externe (Redis) avant de recalculer la réponse
+@functools.lru_cache(maxsize=2048)
+@memoize_if_shared(timeout=3600)
+def route_question(question_lower):
+    """Route a lowercased question to its answer (cached, exact match on the question)"""
     
     # =========================================================================
     #  FEUILLE DE ROUTE / FUTURES AMÉLIORATIONS (ISSAT Kairouan Chatbot)
@@ -213,31 +447,18 @@ def get_smart_response(user_question, all_data, qa_data):
     #    - Calendrier Universitaire: TO DO (Implémenter gestion des dates/événements)
     # =========================================================================
     
-    question_lower = user_question.lower()
+    # Question normalisée une seule fois, puis transmise aux fonctions de matching
+    question_norm = normalize_text(question_lower)
+    intents = detect_intents(question_lower)
     
     # Try to find match in Q&A training data first
-    qa_answer, qa_score = find_best_qa_match(user_question, qa_data)
+    qa_answer, qa_score = find_best_qa_match(question_norm, qa_index)
     if qa_answer and qa_score > 0.6:
         return f"<strong>✅ Réponse:</strong><br><br>{qa_answer}"
     
     # Greetings (Pas de changement)
-    if any(word in question_lower for word in ['ahla', 'salam', 'aslema', 'labes', 'chnahwelek', 'aychek', 'bonjour', 'salut']):
-        return """
-        <strong>Ahla w sahla bik! 👋</strong><br>
-        <strong>Labes elhamdulillah! 💙</strong><br><br>
-        Ena assistant mta3 l'ISSAT Kairouan, m3allem 3la kol les données! 😊<br><br>
-        <strong>💡 Njem nsa3dek fi:</strong><br>
-        • Détails des programmes (Licences, Masters)<br>
-        • Heures de cours, TP, TD, crédits<br>
-        • Procédures administratives<br>
-        • Règles d'absence<br>
-        • Informations sur l'institut<br><br>
-        <strong>Exemples de questions:</strong><br>
-        • "Combien d'heures de TP dans le master automatique?"<br>
-        • "Quels sont les cours du semestre 1?"<br>
-        • "Comment justifier une absence?"<br><br>
-        Qolli chnowa t7eb ta3ref! 🎓
-        """
+    if 'greeting' in intents:
+        return GREETING_RESPONSE
     
     # --- LOGIQUE AMÉLIÉE POUR LES QUESTIONS SUR LES PROGRAMMES ---
     
@@ -246,8 +467,7 @@ def get_smart_response(user_question, all_data, qa_data):
     semestre_num, type_heure = extract_details(question_lower)
     
     if program_name:
-        master_data = all_data.get('master_recherche', [])
-        stats = calculate_master_stats(master_data, program_name)
+        stats = program_to_stats.get(program_name)
         
         if stats:
             program_title = stats['title']
@@ -265,8 +485,8 @@ def get_smart_response(user_question, all_data, qa_data):
                         <strong>Total TP Semestre {semestre_num}:</strong> {sem['tp_hours']} heures<br><br>
                         <strong>Détail des ateliers:</strong><br>
                         {
-                            '<br>'.join([f"• {ue['nom']}: {sum([ecue['tp'] for ecue in ue['ecues']])}h" 
-                            for ue in sem['ues'] if sum([ecue['tp'] for ecue in ue['ecues']]) > 0])
+                            '<br>'.join([f"• {ue['nom']}: {ue['tp_total']}h" 
+                            for ue in sem['ues'] if ue['tp_total'] > 0])
                         }<br><br>
                         💡 Veux-tu le volume horaire total de ce semestre?
                         """
@@ -305,7 +525,7 @@ def get_smart_response(user_question, all_data, qa_data):
 
             
             # 3. Logique de réponse pour les Crédits
-            if any(word in question_lower for word in ['crédit', 'credit', 'ects']):
+            if 'credit' in intents:
                 return f"""
                 <strong>🎓 Crédits - {program_title}:</strong><br><br>
                 <strong>Total master:</strong> {stats['total_credits']} crédits<br><br>
@@ -318,7 +538,7 @@ def get_smart_response(user_question, all_data, qa_data):
                 """
             
             # 4. Logique de réponse pour les Cours/Matières
-            if any(word in question_lower for word in ['semestre', 'cours du', 'matières', 'ues']):
+            if 'semester' in intents:
                 # Si un semestre spécifique est demandé
                 for i, sem in enumerate(stats['semesters'], 1):
                     if semestre_num == i:
@@ -349,10 +569,9 @@ def get_smart_response(user_question, all_data, qa_data):
     
     # Basic responses (Pas de changement)
     # Director
-    if any(word in question_lower for word in ['directeur', 'director']):
-        pres = all_data.get('presentation', {}).get('Presentation', {})
-        directeur = pres.get('Direction', {}).get('Directeur', 'Non disponible')
-        sec_gen = pres.get('Direction', {}).get('Secretaire_general', 'Non disponible')
+    if 'director' in intents:
+        directeur = direction.get('Directeur', 'Non disponible')
+        sec_gen = direction.get('Secretaire_general', 'Non disponible')
         return f"""
         <strong>👨‍💼 Direction de l'ISSAT Kairouan:</strong><br><br>
         <strong>Directeur:</strong> {directeur}<br>
@@ -361,9 +580,8 @@ def get_smart_response(user_question, all_data, qa_data):
         """
     
     # Licences
-    if any(word in question_lower for word in ['licence', 'licences', 'bachelor']) and 'master' not in question_lower:
-        pres = all_data.get('presentation', {}).get('Presentation', {})
-        licences = pres.get('Formations', {}).get('Licences', [])
+    if 'licence' in intents and 'master' not in intents:
+        licences = formations.get('Licences', [])
         if licences:
             lic_list = "<br>".join([f"• {lic}" for lic in licences])
             return f"""
@@ -373,65 +591,49 @@ def get_smart_response(user_question, all_data, qa_data):
             """
     
     # Masters
-    if any(word in question_lower for word in ['master', 'masters', 'mastere']) and not program_name:
-        pres = all_data.get('presentation', {}).get('Presentation', {})
-        masters_rech = pres.get('Formations', {}).get('Masters_Recherche', [])
-        masters_pro = pres.get('Formations', {}).get('Masters_Professionnels', [])
+    if 'master' in intents and not program_name:
+        masters_rech = formations.get('Masters_Recherche', [])
+        masters_pro = formations.get('Masters_Professionnels', [])
         
-        response = "<strong>🎓 Masters disponibles à l'ISSAT Kairouan:</strong><br><br>"
+        parts = ["<strong>🎓 Masters disponibles à l'ISSAT Kairouan:</strong><br><br>"]
         
         if masters_rech:
-            response += "<strong>Masters Recherche:</strong><br>"
-            response += "<br>".join([f"• {m}" for m in masters_rech])
-            response += "<br><br>"
+            parts.append("<strong>Masters Recherche:</strong><br>")
+            parts.append("<br>".join([f"• {m}" for m in masters_rech]))
+            parts.append("<br><br>")
         
         if masters_pro:
-            response += "<strong>Masters Professionnels:</strong><br>"
-            response += "<br>".join([f"• {m}" for m in masters_pro])
-            response += "<br><br>"
+            parts.append("<strong>Masters Professionnels:</strong><br>")
+            parts.append("<br>".join([f"• {m}" for m in masters_pro]))
+            parts.append("<br><br>")
         
-        response += "💡 Veux-tu plus de détails sur un master?"
-        return response
+        parts.append("💡 Veux-tu plus de détails sur un master?")
+        return ''.join(parts)
     
     # Absence rules
-    if any(word in question_lower for word in ['absence', 'absent', 'justif']):
-        rules = all_data.get('absences_rules', {})
+    if 'absence' in intents:
         return f"""
         <strong>📋 Règles d'absence:</strong><br><br>
-        <strong>Différence:</strong><br>{rules.get('difference', '').replace(chr(10), '<br>')}<br><br>
-        <strong>Comment justifier:</strong><br>{rules.get('submit_how', '').replace(chr(10), '<br>')}<br><br>
-        <strong>Délais:</strong> {rules.get('deadlines', '')}<br><br>
-        <strong>⚠️ Avertissement:</strong> {rules.get('warning_logic', '')}<br><br>
-        <strong>❌ Élimination:</strong> {rules.get('elimination_logic', '')}
+        <strong>Différence:</strong><br>{absences_rules.get('difference', '').replace(chr(10), '<br>')}<br><br>
+        <strong>Comment justifier:</strong><br>{absences_rules.get('submit_how', '').replace(chr(10), '<br>')}<br><br>
+        <strong>Délais:</strong> {absences_rules.get('deadlines', '')}<br><br>
+        <strong>⚠️ Avertissement:</strong> {absences_rules.get('warning_logic', '')}<br><br>
+        <strong>❌ Élimination:</strong> {absences_rules.get('elimination_logic', '')}
         """
     
     # ISSAT info
-    if any(word in question_lower for word in ['issat', 'institut', 'kairouan', 'creation', 'créé']):
-        pres = all_data.get('presentation', {}).get('Presentation', {})
-        etab = pres.get('Etablissement', {})
-        creation = pres.get('Creation', {})
-        infra = pres.get('Infrastructure', {})
-        
+    if 'issat' in intents:
         return f"""
         <strong>🏛️ ISSAT Kairouan:</strong><br><br>
-        <strong>Nom:</strong> {etab.get('Nom', '')}<br>
+        <strong>Nom:</strong> {etablissement.get('Nom', '')}<br>
         <strong>Création:</strong> {creation.get('Annee', '')} ({creation.get('Decret', '')})<br>
-        <strong>Capacité:</strong> {infra.get('Capacite', {}).get('Etudiants', '')} étudiants<br>
-        <strong>Enseignants:</strong> {infra.get('Capacite', {}).get('Enseignants', '')}<br><br>
+        <strong>Capacité:</strong> {capacite.get('Etudiants', '')} étudiants<br>
+        <strong>Enseignants:</strong> {capacite.get('Enseignants', '')}<br><br>
         💡 Veux-tu en savoir plus?
         """
     
     # Default fallback
-    return """
-    <strong>🤔 Je n'ai pas bien compris ta question...</strong><br><br>
-    💡 <strong>Exemples de questions:</strong><br>
-    • "Combien d'heures de TP dans le master automatique?"<br>
-    • "Quels sont les masters disponibles?"<br>
-    • "Quelles licences sont disponibles?"<br>
-    • "Comment justifier une absence?"<br>
-    • "Qui est le directeur?"<br><br>
-    Essaie de reformuler! 😊
-    """
+    return FALLBACK_RESPONSE
 
 # Load all data
 print("🔄 Loading data...")
@@ -449,8 +651,8 @@ for file in files:
         all_data[file.replace('.json', '')] = data
         print(f"✅ Loaded {file}")
 
-# Load Q&A training data
-qa_data = load_json("c:/Users/DELL/Desktop/Chatbot/training_qa.json")
+# Load Q&A training data (data/training_qa.json, à côté des autres fichiers)
+qa_data = load_json("training_qa.json")
 if qa_data:
     total_qa = sum(len(category) for category in qa_data.values())
     print(f"✅ Loaded {total_qa} Q&A training examples")
@@ -458,10 +660,40 @@ else:
     qa_data = {}
     print("⚠️ No Q&A training data found")
 
+qa_index = build_qa_index(qa_data)
+
+# Empreinte des fichiers de données, utilisée dans la clé des réponses mémorisées
+data_hash = hashlib.sha256()
+for file in files + ["training_qa.json"]:
+    path = os.path.join(DATA_DIR, file)
+    if os.path.exists(path):
+        with open(path, "rb") as f:
+            data_hash.update(f.read())
+data_fingerprint = data_hash.hexdigest()[:16]
+
+# Statistiques des masters calculées une seule fois (les données sont statiques)
+program_to_stats = build_master_index(all_data.get('master_recherche', []))
+
+# Sections de la présentation extraites une seule fois pour les réponses de base
+presentation = all_data.get('presentation', {}).get('Presentation', {})
+direction = presentation.get('Direction', {})
+formations = presentation.get('Formations', {})
+etablissement = presentation.get('Etablissement', {})
+creation = presentation.get('Creation', {})
+capacite = presentation.get('Infrastructure', {}).get('Capacite', {})
+absences_rules = all_data.get('absences_rules', {})
+
 print(f"✅ System ready with {len(all_data)} data files")
 
-# Conversation storage
-conversations = []
+# Conversation storage : one history per session, stored in the cache under the session id
+# (only the last 50 messages are kept and rendered)
+MAX_MESSAGES = 50
+CONVERSATION_TIMEOUT = 24 * 3600
+# Le serveur traite les requêtes dans plusieurs threads, voire plusieurs processus :
+# lecture-modification-écriture de l'historique sous un verrou pris dans le backend du cache
+# (all_data, qa_index et les statistiques ne sont que lus). Le verrou expire de lui-même
+# si son détenteur s'arrête sans le libérer
+CONVERSATION_LOCK_TIMEOUT = 5
 
 HTML = '''
 <!DOCTYPE html>
@@ -598,7 +830,7 @@ HTML = '''
                 💡 Je peux répondre à des questions précises sur les heures, crédits, cours, etc.
             </div>
             {% for msg in messages %}
-            <div class="message {{msg.type}}">{{msg.content|safe}}</div>
+            <div class="message {{msg.type}}">{{msg.content}}</div>
             {% endfor %}
         </div>
         <div class="input-form">
@@ -617,25 +849,89 @@ HTML = '''
 </html>
 '''
 
+# Template compiled once at import time instead of on every request
+PAGE_TEMPLATE = app.jinja_env.from_string(HTML)
+
+def conversation_key(sid):
+    return f"conversation/{sid}"
+
+@contextlib.contextmanager
+def conversation_lock(sid):
+    """Verrou de l'historique d'une session, partagé par tous les threads et processus."""
+    # cache.add n'écrit la clé que si elle est absente, de façon atomique (SETNX avec Redis,
+    # verrou interne avec SimpleCache) : un seul détenteur à la fois
+    lock_key = f"{conversation_key(sid)}/lock"
+    deadline = time.monotonic() + CONVERSATION_LOCK_TIMEOUT
+    while not cache.add(lock_key, 1, timeout=CONVERSATION_LOCK_TIMEOUT):
+        if time.monotonic() > deadline:
+            # Verrou orphelin (détenteur arrêté avant que l'expiration ne soit posée) : repris
+            cache.set(lock_key, 1, timeout=CONVERSATION_LOCK_TIMEOUT)
+            break
+        time.sleep(0.01)
+    try:
+        yield
+    finally:
+        cache.delete(lock_key)
+
+def render_home_page():
+    """Rend la page avec l'historique de la session ; mise en cache tant qu'aucun message n'est ajouté."""
+    sid = session.get('sid')
+    conversation = (cache.get(conversation_key(sid)) if sid else None) or {"version": 0, "messages": []}
+    # La version, stockée avec l'historique côté serveur, change à chaque échange :
+    # pas d'invalidation explicite, et les onglets d'une même session voient la même page
+    page_key = f"home_page/{sid}/{conversation['version']}"
+    page = cache.get(page_key)
+    if page is None:
+        page = PAGE_TEMPLATE.render(messages=conversation["messages"])
+        cache.set(page_key, page, timeout=30)
+    return page
+
 @app.route("/", methods=["GET", "POST"])
 def home():
-    global conversations
-    
     if request.method == "POST":
         user_msg = request.form.get("q", "").strip()
         if user_msg:
-            conversations.append({"type": "user", "content": user_msg})
             print(f"👤 User: {user_msg}")
             
-            response = get_smart_response(user_msg, all_data, qa_data)
-            conversations.append({"type": "bot", "content": response})
+            # La réponse est calculée hors du verrou ; la question et la réponse
+            # sont ajoutées ensemble pour rester côte à côte dans l'historique.
+            # Contenus marqués sûrs une fois ici (question échappée, réponse HTML du bot) :
+            # le template les affiche sans filtre ni ré-échappement
+            response = get_smart_response(user_msg)
+            sid = session.setdefault('sid', secrets.token_hex(16))
+            with conversation_lock(sid):
+                conversation = cache.get(conversation_key(sid)) or {"version": 0, "messages": []}
+                messages = conversation["messages"]
+                messages.append({"type": "user", "content": escape(user_msg)})
+                messages.append({"type": "bot", "content": Markup(response)})
+                cache.set(conversation_key(sid), {
+                    "version": conversation["version"] + 1,
+                    "messages": messages[-MAX_MESSAGES:],
+                }, timeout=CONVERSATION_TIMEOUT)
             print(f"🤖 Bot: Response generated")
     
-    return render_template_string(HTML, messages=conversations)
+    return render_home_page()
+
+@app.after_request
+def add_etag(response):
+    """ETag calculé sur le corps des GET : un rechargement sans changement renvoie 304."""
+    if request.method == "GET" and response.status_code == 200 and not response.direct_passthrough:
+        response.add_etag()
+        response = response.make_conditional(request)
+    return response
 
 if __name__ == "__main__":
     print("🚀 ISSAT Smart Chatbot Starting...")
     print("🧠 Trained on detailed Q&A examples")
     print("💡 Can answer complex questions about courses, hours, credits, etc.")
     print("🌐 Server: http://127.0.0.1:5000")
-    app.run(host="127.0.0.1", port=5000, debug=True)
+    # Plusieurs processus : gunicorn -w 4 -k gthread --threads 2 chatbot_smart:app
+    # (avec CACHE_TYPE=RedisCache et un SECRET_KEY commun pour partager les sessions)
+    if os.environ.get("FLASK_DEBUG") == "1":
+        # Serveur de développement avec debugger et rechargement automatique
+        app.run(host="127.0.0.1", port=5000, debug=True)
+    else:
+        from waitress import serve
+        
+        # Serveur WSGI de production multi-thread (pas de mode debug ni de rechargement automatique)
+        serve(app, host="127.0.0.1", port=5000, threads=8)
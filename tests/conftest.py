@@ -0,0 +1,19 @@
+import os
+import sys
+
+import pytest
+
+# Les modules de l'application sont des scripts à la racine du dépôt
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session")
+def chatbot(tmp_path_factory):
+    """Module chatbot_smart importé depuis un dossier vide : aucun fichier de data/ n'est chargé."""
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp("no_data"))
+    try:
+        import chatbot_smart
+    finally:
+        os.chdir(cwd)
+    return chatbot_smart
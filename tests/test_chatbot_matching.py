@@ -0,0 +1,152 @@
+import random
+import re
+
+import pytest
+
+
+# --- extract_program_name ---
+
+def test_program_keyword_priority_beats_position(chatbot):
+    # 'génie' apparaît en premier dans la question mais 'automatique' est avant dans PROGRAM_KEYWORDS
+    assert chatbot.extract_program_name("combien d'heures de tp en génie automatique?") == 'automatique'
+
+
+def test_longest_program_keyword_wins(chatbot):
+    assert chatbot.extract_program_name("master informatique industrielle") == 'informatique industrielle'
+
+
+def test_program_keyword_must_start_a_word(chatbot):
+    assert chatbot.extract_program_name("bioinformatique et automatiques") == 'automatique'
+
+
+def reference_program_keyword(keywords, question_lower):
+    """Premier mot-clé de la liste présent en début de mot (sémantique attendue de l'étape 1)."""
+    for keyword in keywords:
+        if re.search(r'(?<!\w)' + re.escape(keyword), question_lower):
+            return keyword
+    return None
+
+
+def test_program_keyword_matches_reference_on_generated_questions(chatbot):
+    words = [
+        'combien', "d'heures", 'de', 'tp', 'en', 'master', 'le', 'parcours',
+        'génie', 'automatique', 'automatiques', 'informatique', 'industrielle',
+        'bioinformatique', 'reseaux', 'telecom', 'mecanique', 'industrie',
+        'electronique', 'genie', 'civil', 'electrique', 'semestre', '1',
+    ]
+    rng = random.Random(0)
+    for _ in range(20000):
+        question = ' '.join(rng.choice(words) for _ in range(rng.randint(1, 8)))
+        expected = reference_program_keyword(chatbot.PROGRAM_KEYWORDS, question)
+        if expected is not None:
+            assert chatbot.extract_program_name(question) == expected, question
+
+
+# --- extract_details ---
+
+@pytest.mark.parametrize("question, expected", [
+    ("combien d'heures de tp en génie automatique?", (None, 'tp')),
+    ("combien d'heures totales dans le master automatique?", (None, 'total')),
+    ("volume horaire du semestre 2", (2, 'total')),
+    ("heures de tp1 au troisième semestre 1", (1, 'tp')),
+    ("troisième semestre", (3, None)),
+    ("je veux pratiquer en s2", (2, 'tp')),
+    ("heures de td du deuxième semestre", (2, 'td')),
+    ("heures de cours en s4", (4, 'cours')),
+])
+def test_extract_details(chatbot, question, expected):
+    assert chatbot.extract_details(question) == expected
+
+
+@pytest.mark.parametrize("question", [
+    "stp le parcours http",
+    "semestre 10",
+    "s10",
+])
+def test_extract_details_ignores_mid_word_matches(chatbot, question):
+    assert chatbot.extract_details(question) == (None, None)
+
+
+def test_genie_automatique_tp_hours_answer(chatbot, monkeypatch):
+    master = {
+        'Parcours': 'Automatique',
+        'Semestres': [{
+            'Semestre': 1,
+            'Total_Credits': 30,
+            'Unites_Enseignement': [{
+                'Libelle_UE': 'Commande',
+                'ECUEs': [{'Libelle_ECUE': 'Asservissement', 'TP': 21, 'Cours': 10, 'TD': 5}],
+            }],
+        }],
+    }
+    monkeypatch.setattr(chatbot, 'program_to_stats', chatbot.build_master_index([master]))
+
+    # route_question sans le cache : la réponse dépend de program_to_stats remplacé ici
+    answer = chatbot.route_question.__wrapped__("combien d'heures de tp en génie automatique?")
+
+    assert 'Heures de TP - Master Automatique' in answer
+    assert '21 heures' in answer
+
+
+# --- detect_intents ---
+
+@pytest.mark.parametrize("question", ["assalam", "assalamou alaykom", "ahlaaa", "bonjour"])
+def test_greeting_matches_anywhere_in_a_word(chatbot, question):
+    assert 'greeting' in chatbot.detect_intents(question)
+
+
+def test_greeting_answer_for_assalam(chatbot):
+    assert chatbot.route_question.__wrapped__("assalam") == chatbot.GREETING_RESPONSE
+
+
+@pytest.mark.parametrize("question, intent", [
+    ("quelles questions", 'semester'),
+    ("projects", 'credit'),
+])
+def test_other_intents_start_a_word(chatbot, question, intent):
+    assert intent not in chatbot.detect_intents(question)
+
+
+# --- normalize_text ---
+
+def reference_normalize_text(text):
+    """Version d'origine : deux passes re.sub."""
+    text = text.lower()
+    text = re.sub(r'3', 'a', text)
+    return re.sub(r'[^a-z0-9\s]', '', text)
+
+
+def test_normalize_text_matches_reference_below_u3000(chatbot):
+    for code in range(0x3000):
+        text = f"Ab3 {chr(code)}x"
+        assert chatbot.normalize_text(text) == reference_normalize_text(text), hex(code)
+
+
+def test_normalize_text_matches_reference_on_mixed_strings(chatbot):
+    rng = random.Random(0)
+    for _ in range(5000):
+        text = ''.join(chr(rng.choice([rng.randrange(128), rng.randrange(0x700)])) for _ in range(12))
+        assert chatbot.normalize_text(text) == reference_normalize_text(text), repr(text)
+
+
+def test_normalize_text_table_does_not_grow(chatbot):
+    size = len(chatbot.ASCII_NORMALIZE_TABLE)
+    chatbot.normalize_text("مرحبا ça va? 😊 " + ''.join(map(chr, range(0x4e00, 0x4f00))))
+    assert len(chatbot.ASCII_NORMALIZE_TABLE) == size == 128
+
+
+# --- find_best_qa_match ---
+
+def test_qa_match_on_empty_index(chatbot):
+    assert chatbot.find_best_qa_match("bonjour", chatbot.build_qa_index({})) == (None, 0)
+
+
+def test_qa_match_exact_question_and_empty_keywords(chatbot):
+    qa_index = chatbot.build_qa_index({'general': [
+        {'question': "Où est l'ISSAT ?", 'answer': 'Kairouan', 'keywords': ['', '!!']},
+        {'question': 'Combien de crédits ?', 'answer': '120 ECTS', 'keywords': ['credits']},
+    ]})
+
+    assert chatbot.find_best_qa_match(chatbot.normalize_text("Où est l'ISSAT ?"), qa_index) == ('Kairouan', 1.0)
+    answer, score = chatbot.find_best_qa_match('credits du master', qa_index)
+    assert answer == '120 ECTS' and score > 0.4
@@ -0,0 +1,60 @@
+import app
+
+
+def make_document(filler_count):
+    """Un thème répété dans quelques phrases, noyé parmi des phrases sans mot commun."""
+    topic = [
+        f"Le réseau de neurones ajuste ses poids pendant l'apprentissage, exemple {i}."
+        for i in range(6)
+    ]
+    filler = [
+        f"Phrase annexe numéro{i} parle de sujet{i} avec détail{i} et remarque{i}."
+        for i in range(filler_count)
+    ]
+    return topic + filler, len(topic)
+
+
+def test_sparse_lsa_scores_separate_repeated_topic_from_filler():
+    sentences, topic_count = make_document(74)
+    scores = app.compute_sparse_lsa_scores(sentences)
+
+    assert len(scores) == len(sentences)
+    assert min(scores[:topic_count]) > max(scores[topic_count:])
+
+
+def test_sparse_lsa_scores_are_not_all_equal():
+    # Avec des lignes normalisées L2 et une SVD presque complète, tous les scores valaient ~1
+    sentences, _ = make_document(94)
+    scores = app.compute_sparse_lsa_scores(sentences)
+
+    assert max(scores) - min(scores) > 0.5 * max(scores)
+
+
+def test_sparse_lsa_scores_without_vocabulary_are_zero():
+    assert app.compute_sparse_lsa_scores(["Le la les.", "Les le la."]) == [0.0, 0.0]
+
+
+def make_pdf(page_texts):
+    import pymupdf
+
+    with pymupdf.open() as doc:
+        for text in page_texts:
+            page = doc.new_page()
+            if text:
+                page.insert_text((72, 72), text)
+        return doc.tobytes()
+
+
+def test_extract_text_keeps_pdf_whose_first_pages_are_blank():
+    # Couverture et pages de titre scannées (sans texte), puis le corps du cours
+    body = "Introduction au cours de systèmes asservis et à la commande des moteurs."
+    pdf_bytes = make_pdf(["", "", "", body, body])
+
+    text = app.extract_text_from_pdf(pdf_bytes)
+
+    assert text is not None
+    assert "systèmes asservis" in text
+
+
+def test_extract_text_rejects_pdf_without_text():
+    assert app.extract_text_from_pdf(make_pdf(["", "", "", ""])) is None